@@ -1,13 +1,21 @@
 __all__ = ("data_dict", "scheduler_download_data", "download_rubin_data", "DEFAULT_DATA_URL")
 
 import argparse
+import hashlib
 import os
+import re
+import signal
+import subprocess
+import tarfile
 import warnings
-from shutil import rmtree, unpack_archive
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from shutil import rmtree, which
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError
 from tqdm.auto import tqdm
+from urllib3.util import Retry
 
 from .data_sets import data_versions, get_data_dir
 
@@ -35,6 +43,246 @@ def data_dict():
     return file_dict
 
 
+class _HashingReader:
+    """Read-only file-like wrapper which computes the sha256 of all
+    bytes read through it.
+
+    Parameters
+    ----------
+    fileobj : file-like
+        Object with a `read` method to wrap.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.sha256.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def _unpack_tgz(fileobj, data_dir, block_size=8 * 1024 * 1024):
+    """Unpack a gzipped tar stream into data_dir, as it is read.
+
+    Pipes the output of the multi-threaded `pigz` decompressor into
+    `tar` when both are available, otherwise falls back to `tarfile`
+    in streaming mode.
+    Either way the archive itself is never written to disk, and
+    fileobj is read through to the end.
+
+    Parameters
+    ----------
+    fileobj : file-like
+        Object with a `read` method returning the .tgz bytes.
+    data_dir : `str`
+        Directory to unpack into.
+    block_size : `int`
+        Number of bytes to read from fileobj at a time.
+    """
+    if which("pigz") is not None and which("tar") is not None:
+        # Decompress in a separate process rather than with `tar -I`,
+        # which only GNU tar understands (bsdtar reads -I as a file of
+        # include patterns).
+        pigz_args = ["pigz", "-dc"]
+        tar_args = ["tar", "-xf", "-", "-C", data_dir]
+        pigz = subprocess.Popen(pigz_args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        tar = subprocess.Popen(tar_args, stdin=pigz.stdout)
+        # Only tar should hold the read end, so pigz sees tar exit
+        pigz.stdout.close()
+        try:
+            while chunk := fileobj.read(block_size):
+                pigz.stdin.write(chunk)
+        except BrokenPipeError:
+            # pigz has exited; the return codes say whether it failed
+            pass
+        except BaseException:
+            # Reading failed (or was interrupted), don't leave either behind
+            for proc in (pigz, tar):
+                proc.kill()
+                proc.wait()
+            raise
+        finally:
+            try:
+                pigz.stdin.close()
+            except BrokenPipeError:
+                pass
+        if tar.wait() != 0:
+            raise subprocess.CalledProcessError(tar.returncode, tar_args)
+        # 2 is a warning (e.g. trailing padding ignored). pigz may also be
+        # stopped by SIGPIPE if tar finished before the end of the stream.
+        if pigz.wait() not in (0, 2, -signal.SIGPIPE):
+            raise subprocess.CalledProcessError(pigz.returncode, pigz_args)
+    else:
+        # The "data" filter refuses members which would land
+        # outside of data_dir (available in python >= 3.11.4)
+        kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+        # Read and write in block_size pieces, rather than tarfile's
+        # default 10 KiB records and 16 KiB copies.
+        with tarfile.open(fileobj=fileobj, mode="r|gz", bufsize=block_size, copybufsize=block_size) as tf:
+            tf.extractall(data_dir, **kwargs)
+    # Consume anything after the end-of-archive marker
+    while fileobj.read(block_size):
+        pass
+
+
+def _make_session(pool_maxsize=4):
+    """Make a `requests.Session` which keeps connections alive between
+    requests and retries transient server errors.
+
+    Parameters
+    ----------
+    pool_maxsize : `int`
+        Number of connections to keep open to each host, should be
+        at least the number of concurrent downloads. Default 4.
+
+    Returns
+    -------
+    session : `requests.Session`
+    """
+    # Return the last response rather than raising once retries run out,
+    # so callers can keep checking status_code as usual
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _etag(headers):
+    """Return the ETag from a set of HTTP headers, without quotes."""
+    return headers.get("ETag", "").strip('"')
+
+
+def _expected_sha256(url, session=requests):
+    """Look up the published sha256 digest of a file, if there is one.
+
+    Parameters
+    ----------
+    url : `str`
+        The URL of the file. The digest is expected at url + ".sha256",
+        in the format written by `sha256sum`.
+    session : `requests.Session`
+        Session to make the request with. Default uses `requests` directly.
+
+    Returns
+    -------
+    sha256 : `str` or None
+        The expected hex digest, or None if it could not be found.
+        Responses which do not start with a sha256 hex digest (such as
+        an error or index page served in place of a missing file)
+        count as not found.
+    """
+    try:
+        r = session.get(url + ".sha256")
+    except ConnectionError:
+        return None
+    if r.status_code != requests.codes.ok:
+        return None
+    match = re.match(r"\s*([0-9a-fA-F]{64})(\s|$)", r.text)
+    if match is None:
+        return None
+    return match.group(1).lower()
+
+
+def _version_metadata(version_file):
+    """Read the ETag and sha256 columns of a versions.txt file.
+
+    Parameters
+    ----------
+    version_file : `str`
+        Path to the versions.txt file.
+
+    Returns
+    -------
+    etags, digests : `dict`, `dict`
+        Dictionaries keyed by data bucket name holding the ETag and
+        sha256 hex digest of the tar file each bucket was unpacked from.
+        Buckets written by older versions of this script have no entry.
+    """
+    etags = {}
+    digests = {}
+    if os.path.isfile(version_file):
+        with open(version_file) as f:
+            for line in f:
+                ack = line.strip().split(",")
+                if len(ack) > 2 and ack[2] != "":
+                    etags[ack[0]] = ack[2]
+                if len(ack) > 3 and ack[3] != "":
+                    digests[ack[0]] = ack[3]
+    return etags, digests
+
+
+def _download_and_unpack(url, filename, data_dir, position=0, tdqm_disable=False, session=requests):
+    """Download a single tar file, unpacking it into data_dir as it
+    is downloaded.
+
+    The archive is verified against its published sha256 digest, if
+    there is one, only once it has been completely unpacked. On a
+    mismatch the unpacked files are left in place for the caller
+    to remove.
+
+    Parameters
+    ----------
+    url : `str`
+        The URL of the file to download.
+    filename : `str`
+        The name of the file, used to label the progress bar.
+    data_dir : `str`
+        Directory to unpack into.
+    position : `int`
+        Line offset of the tdqm progress bar. Default 0.
+    tdqm_disable : `bool`
+        If True, disable the tdqm progress bar. Default False.
+    session : `requests.Session`
+        Session to make the requests with. Default uses `requests` directly.
+
+    Returns
+    -------
+    etag : `str`
+        The ETag the server reported for the file ('' if none).
+    sha256 : `str`
+        The sha256 hex digest of the downloaded file.
+
+    Raises
+    ------
+    requests.HTTPError
+        If the server does not return the file.
+    ValueError
+        If a digest is published alongside the file and does not match
+        the downloaded bytes.
+    """
+    print("Downloading file: %s" % url)
+    # Stream and write in chunks (avoid large memory usage)
+    with session.get(url, stream=True) as r:
+        r.raise_for_status()
+        file_size = int(r.headers.get("Content-Length", 0))
+        if file_size < 245:
+            warnings.warn(f"{url} file size unexpectedly small.")
+        # Download this size chunk at a time. Large blocks keep the
+        # number of reads (and progress bar updates) per GB low.
+        block_size = 8 * 1024 * 1024
+        print(f"Unpacking {filename} to {data_dir}")
+        # Unpack straight from the response as it downloads, so the archive
+        # is never written to disk, hashing the bytes as they go by.
+        r.raw.decode_content = True
+        with tqdm.wrapattr(
+            r.raw, "read", total=file_size, desc=filename, position=position, disable=tdqm_disable
+        ) as raw:
+            reader = _HashingReader(raw)
+            _unpack_tgz(reader, data_dir, block_size=block_size)
+    digest = reader.hexdigest()
+    expected = _expected_sha256(url, session=session)
+    if expected is not None and digest != expected:
+        raise ValueError(f"sha256 of {url} is {digest}, expected {expected}")
+    return _etag(r.headers), digest
+
+
 def scheduler_download_data(file_dict=None):
     """Download data."""
 
@@ -118,6 +366,8 @@ def download_rubin_data(
         If True, print the versions currently on disk. Default False.
     update : `bool`
         If True, update versions on disk to match expected 'current'.
+        Directories which already match are also re-downloaded if the
+        ETag of the remote file has changed since they were downloaded.
         Default False.
     force : `bool`
         If True, replace versions on disk with new download. Default False.
@@ -161,12 +411,17 @@ def download_rubin_data(
             return 1
 
     version_file = os.path.join(data_dir, "versions.txt")
+    etags, digests = _version_metadata(version_file)
+
+    # Share one pool of kept-alive connections between all requests,
+    # with enough connections for every download to run at once.
+    session = _make_session(pool_maxsize=max(len(dirs), 1))
 
     # See if base URL is alive
     url_base = url_base
     fail_message = f"Could not connect to {url_base}. Check site is up?"
     try:
-        r = requests.get(url_base)
+        r = session.get(url_base)
     except ConnectionError:
         print(fail_message)
         exit()
@@ -175,8 +430,8 @@ def download_rubin_data(
         exit()
 
     # Now do downloading for "dirs"
+    to_download = []
     for key in dirs:
-        filename = file_dict[key]
         path = os.path.join(data_dir, key)
         # Do some thinking to see if we should download new data for key
         download_this_dir = True
@@ -193,36 +448,69 @@ def download_rubin_data(
                 # Update only if necessary
                 if versions.get(key, "") == file_dict[key]:
                     download_this_dir = False
+                    # Catch a remote file replaced under the same name
+                    if key in etags:
+                        try:
+                            r = session.head(url_base + file_dict[key], allow_redirects=True)
+                        except requests.exceptions.RequestException:
+                            # ETag unknown, keep the existing directory
+                            r = None
+                        if (
+                            r is not None
+                            and r.status_code == requests.codes.ok
+                            and _etag(r.headers) not in ("", etags[key])
+                        ):
+                            download_this_dir = True
+                            rmtree(path)
+                            warnings.warn("Removed existing directory %s, remote file has changed" % path)
                 else:
                     rmtree(path)
                     warnings.warn("Removed existing directory %s, downloading updated version" % path)
         if download_this_dir:
-            # Download file
-            url = url_base + filename
-            print("Downloading file: %s" % url)
-            # Stream and write in chunks (avoid large memory usage)
-            r = requests.get(url, stream=True)
-            file_size = int(r.headers.get("Content-Length", 0))
-            if file_size < 245:
-                warnings.warn(f"{url} file size unexpectedly small.")
-            # Download this size chunk at a time; reasonable guess
-            block_size = 512 * 512 * 10
-            progress_bar = tqdm(total=file_size, unit="iB", unit_scale=True, disable=tdqm_disable)
-            print(f"Writing to {os.path.join(data_dir, filename)}")
-            with open(os.path.join(data_dir, filename), "wb") as f:
-                for chunk in r.iter_content(chunk_size=block_size):
-                    progress_bar.update(len(chunk))
-                    f.write(chunk)
-            progress_bar.close()
-            # untar in place
-            unpack_archive(os.path.join(data_dir, filename), data_dir)
-            os.remove(os.path.join(data_dir, filename))
-            versions[key] = file_dict[key]
-
-    # Write out the new version info to the data directory
+            to_download.append(key)
+
+    # Download and unpack each file in its own thread, so that
+    # the network transfer of one file overlaps unpacking of another.
+    errors = {}
+    if len(to_download) > 0:
+        with ThreadPoolExecutor(max_workers=len(to_download)) as executor:
+            futures = {}
+            for i, key in enumerate(to_download):
+                future = executor.submit(
+                    _download_and_unpack,
+                    url_base + file_dict[key],
+                    file_dict[key],
+                    data_dir,
+                    position=i,
+                    tdqm_disable=tdqm_disable,
+                    session=session,
+                )
+                futures[future] = key
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    etag, digest = future.result()
+                except Exception as e:
+                    # Don't leave a partial or corrupt directory behind,
+                    # or a record of the version it used to hold
+                    rmtree(os.path.join(data_dir, key), ignore_errors=True)
+                    versions.pop(key, None)
+                    etags.pop(key, None)
+                    digests.pop(key, None)
+                    errors[key] = e
+                    continue
+                versions[key] = file_dict[key]
+                etags[key] = etag
+                digests[key] = digest
+
+    # Write out the new version info to the data directory.
+    # Columns are key,filename,etag,sha256
     with open(version_file, "w") as f:
         for key in versions:
-            print(key + "," + versions[key], file=f)
+            print(",".join([key, versions[key], etags.get(key, ""), digests.get(key, "")]), file=f)
+
+    if len(errors) > 0:
+        raise RuntimeError(f"Failed to download {', '.join(errors)}") from next(iter(errors.values()))
 
     # Write a little table to stdout
     new_versions = data_versions()
@@ -45,7 +45,7 @@ from astropy.coordinates import SkyCoord
 from rubin_scheduler.scheduler import features, utils
 from rubin_scheduler.scheduler.utils import IntRounded, get_current_footprint
 from rubin_scheduler.skybrightness_pre import dark_m5
-from rubin_scheduler.utils import DEFAULT_NSIDE, SURVEY_START_MJD, _hpid2_ra_dec
+from rubin_scheduler.utils import DEFAULT_NSIDE, SURVEY_START_MJD, _hpid2_ra_dec, _ra_dec_for_nside
 
 
 def send_unused_deprecation_warning(name):
@@ -494,7 +494,7 @@ class EclipticBasisFunction(BaseBasisFunction):
     def __init__(self, nside=DEFAULT_NSIDE, distance_to_eclip=25.0):
         super(EclipticBasisFunction, self).__init__(nside=nside)
         self.distance_to_eclip = np.radians(distance_to_eclip)
-        ra, dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(self.nside)))
+        ra, dec = _ra_dec_for_nside(self.nside)
         self.result = np.zeros(ra.size)
         coord = SkyCoord(ra=ra * u.rad, dec=dec * u.rad)
         eclip_lat = coord.barycentrictrueecliptic.lat.radian
@@ -602,7 +602,7 @@ class SeasonCoverageBasisFunction(BaseBasisFunction):
             footprint = footprints[self.bandname]
         self.footprint = footprint
         # Calculate the RA values for each spot on the footprint
-        ra, dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
+        ra, dec = _ra_dec_for_nside(self.nside)
         self.ra_deg = np.degrees(ra)
 
         self.n_per_season = n_per_season
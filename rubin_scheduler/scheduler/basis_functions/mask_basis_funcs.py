@@ -12,14 +12,146 @@ __all__ = (
 import warnings
 
 import healpy as hp
+import numexpr as ne
 import numpy as np
 
 from rubin_scheduler.scheduler.basis_functions import BaseBasisFunction
-from rubin_scheduler.scheduler.utils import HpInLsstFov, IntRounded
-from rubin_scheduler.utils import DEFAULT_NSIDE, _angular_separation, _hp_grow_mask
+from rubin_scheduler.utils import DEFAULT_NSIDE, _hp_grow_mask
 
+# Tolerance (radians) for comparisons against mask limits, so that values
+# equal to a limit up to floating point noise are treated as equal.
+# This is much finer than the 1e-5 rad quantum of the IntRounded
+# comparisons it replaced, so a pixel within ~1e-5 rad of a limit
+# (e.g. 4.6e-7 rad above max_elong) can land on the other side of it
+# than it used to. That is far below the healpix pixel scale.
+_ATOL = 1e-8
 
-class SolarElongMaskBasisFunction(BaseBasisFunction):
+
+def _gt(a, b):
+    """Return a > b, where values within _ATOL of b are not greater."""
+    return a > (b + _ATOL)
+
+
+def _lt(a, b):
+    """Return a < b, where values within _ATOL of b are not less."""
+    return a < (b - _ATOL)
+
+
+def _alt_in_range(alt, future_alt, min_alt, max_alt):
+    """Find where both current and future altitudes are within limits.
+
+    Evaluated as a single fused, multi-threaded pass with numexpr,
+    so no intermediate arrays are allocated.
+
+    Parameters
+    ----------
+    alt : `np.ndarray`
+        Current altitudes (radians).
+    future_alt : `np.ndarray`
+        Future altitudes (radians).
+    min_alt : `float`
+        Minimum allowed altitude (radians).
+    max_alt : `float`
+        Maximum allowed altitude (radians).
+
+    Returns
+    -------
+    in_range : `np.ndarray`, (N,)
+        Boolean array, True where alt and future_alt are both
+        within [min_alt, max_alt].
+    """
+    return ne.evaluate(
+        "(alt >= min_alt) & (alt <= max_alt) & (future_alt >= min_alt) & (future_alt <= max_alt)",
+        local_dict={"alt": alt, "future_alt": future_alt, "min_alt": min_alt, "max_alt": max_alt},
+    )
+
+
+def _reset_scratch(scratch, template, touched):
+    """Reset a reused result array back to its template values.
+
+    Mask basis functions reuse one result array between calls rather
+    than copying their template map every time. The array they return
+    is overwritten by the next call, so it is handed out read-only
+    (see `_read_only`) and made writeable again here.
+
+    Parameters
+    ----------
+    scratch : `np.ndarray`, (N,)
+        The reused result array.
+    template : `np.ndarray`, (N,) or `float`
+        The values scratch should hold before any masking.
+    touched : `np.ndarray` or None
+        Boolean mask (or indices) of the pixels that were changed on
+        the previous call. If None, or if the indices make up a large
+        fraction of the map, the entire array is reset.
+
+    Returns
+    -------
+    scratch : `np.ndarray`, (N,)
+        The reset result array. This is a new array if scratch could
+        not be made writeable, and should be kept for the next call.
+    """
+    try:
+        scratch.flags.writeable = True
+    except ValueError:
+        # The memory of an unpickled array can belong to an immutable
+        # bytes object, so start over with a fresh array.
+        scratch = np.empty_like(scratch)
+        touched = None
+    if touched is None:
+        np.copyto(scratch, template)
+    elif touched.dtype == bool:
+        np.copyto(scratch, template, where=touched)
+    elif touched.size > 0.1 * scratch.size:
+        np.copyto(scratch, template)
+    else:
+        scratch[touched] = template[touched]
+    return scratch
+
+
+def _read_only(result):
+    """Mark a reused result array read-only before it is returned.
+
+    The maps returned by the mask basis functions in this module are
+    reused between calls and are read-only; copy them before modifying.
+    Only the pixels a basis function itself changed are reset on the
+    next call, so any change made by the caller would otherwise
+    persist into later results.
+
+    Parameters
+    ----------
+    result : `np.ndarray`, (N,)
+        The reused result array.
+
+    Returns
+    -------
+    result : `np.ndarray`, (N,)
+        The same array, no longer writeable.
+    """
+    result.flags.writeable = False
+    return result
+
+
+class _ScratchMixin:
+    """Leave the reused result array of a mask basis function out of
+    its pickled state, and allocate a new one when unpickled.
+
+    An unpickled array may not be able to be made writeable again,
+    and its contents are reset on the next call anyway.
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_scratch"]
+        state["_touched"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._scratch = np.zeros(hp.nside2npix(self.nside), dtype=float)
+
+
+class SolarElongMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Mask regions larger than some solar elongation limit
 
     Parameters
@@ -35,17 +167,20 @@ class SolarElongMaskBasisFunction(BaseBasisFunction):
         )
         warnings.warn(msg, DeprecationWarning)
         super(SolarElongMaskBasisFunction, self).__init__(nside=nside)
-        self.elong_limit = IntRounded(np.radians(elong_limit))
+        self.elong_limit = np.radians(elong_limit)
         self.result = np.zeros(hp.nside2npix(self.nside), dtype=float)
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, indx=None):
-        result = self.result.copy()
-        to_mask = np.where(IntRounded(conditions.solar_elongation) > self.elong_limit)[0]
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
+        to_mask = _gt(conditions.solar_elongation, self.elong_limit)
         result[to_mask] = np.nan
-        return result
+        self._touched = to_mask
+        return _read_only(result)
 
 
-class HaMaskBasisFunction(BaseBasisFunction):
+class HaMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Limit the sky based on hour angle
 
     Parameters
@@ -61,53 +196,62 @@ class HaMaskBasisFunction(BaseBasisFunction):
         self.ha_max = ha_max
         self.ha_min = ha_min
         self.result = np.zeros(hp.nside2npix(self.nside), dtype=float)
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, **kwargs):
-        result = self.result.copy()
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
 
+        to_mask = None
         if self.ha_min is not None:
-            good = np.where(conditions.HA < (self.ha_min / 12.0 * np.pi))[0]
-            result[good] = np.nan
+            to_mask = conditions.HA < (self.ha_min / 12.0 * np.pi)
         if self.ha_max is not None:
-            good = np.where(conditions.HA > (self.ha_max / 12.0 * np.pi))[0]
-            result[good] = np.nan
+            above = conditions.HA > (self.ha_max / 12.0 * np.pi)
+            to_mask = above if to_mask is None else to_mask | above
+        if to_mask is not None:
+            result[to_mask] = np.nan
 
-        return result
+        self._touched = to_mask
+        return _read_only(result)
 
 
-class AreaCheckMaskBasisFunction(BaseBasisFunction):
+class AreaCheckMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Take a list of other mask basis functions, and do an additional
-    check for area available"""
+    check for area available
+    """
 
     def __init__(self, bf_list, nside=DEFAULT_NSIDE, min_area=1000.0):
         super(AreaCheckMaskBasisFunction, self).__init__(nside=nside)
         self.bf_list = bf_list
         self.result = np.zeros(hp.nside2npix(self.nside), dtype=float)
         self.min_area = min_area
+        self._scratch = self.result.copy()
+        self._good = np.ones(hp.nside2npix(self.nside), dtype=bool)
+        self.pix_area = hp.nside2pixarea(self.nside, degrees=True)
 
     def check_feasibility(self, conditions):
-        result = True
         for bf in self.bf_list:
             if not bf.check_feasibility(conditions):
                 return False
 
-        area_map = self.result.copy()
+        # Track pixels which are not masked by any basis function,
+        # stopping as soon as there is not enough area left.
+        good = self._good
+        good.fill(True)
         for bf in self.bf_list:
-            area_map *= bf(conditions)
-
-        good_pix = np.where(area_map == 0)[0]
-        if hp.nside2pixarea(self.nside, degrees=True) * good_pix.size < self.min_area:
-            result = False
-        return result
+            good &= np.isfinite(bf(conditions))
+            if self.pix_area * np.count_nonzero(good) < self.min_area:
+                return False
+        return True
 
     def _calc_value(self, conditions, **kwargs):
-        result = self.result.copy()
+        result = self._scratch = _reset_scratch(self._scratch, self.result, None)
         for bf in self.bf_list:
-            result *= bf(conditions)
-        return result
+            np.multiply(result, bf(conditions), out=result)
+        return _read_only(result)
 
 
-class SolarElongationMaskBasisFunction(BaseBasisFunction):
+class SolarElongationMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Mask things at various solar elongations
 
     Parameters
@@ -123,20 +267,21 @@ class SolarElongationMaskBasisFunction(BaseBasisFunction):
         self.min_elong = np.radians(min_elong)
         self.max_elong = np.radians(max_elong)
         self.penalty = penalty
-        self.result = np.empty(hp.nside2npix(self.nside), dtype=float)
-        self.result.fill(self.penalty)
+        self.result = np.full(hp.nside2npix(self.nside), self.penalty, dtype=float)
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, indx=None):
-        result = self.result.copy()
-        in_range = np.where(
-            (IntRounded(conditions.solar_elongation) >= IntRounded(self.min_elong))
-            & (IntRounded(conditions.solar_elongation) <= IntRounded(self.max_elong))
-        )[0]
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
+        in_range = ~_lt(conditions.solar_elongation, self.min_elong) & ~_gt(
+            conditions.solar_elongation, self.max_elong
+        )
         result[in_range] = 1
-        return result
+        self._touched = in_range
+        return _read_only(result)
 
 
-class PlanetMaskBasisFunction(BaseBasisFunction):
+class PlanetMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Mask the bright planets.
 
     Parameters
@@ -147,7 +292,8 @@ class PlanetMaskBasisFunction(BaseBasisFunction):
         A list of planet names to mask. Defaults to ['venus', 'mars',
         'jupiter']. Not including Saturn because it moves really slowly
         and has average apparent mag of ~0.4, so fainter than Vega.
-
+    scale : float (1e5)
+        Unused, retained for backwards compatibility.
     """
 
     def __init__(self, mask_radius=3.5, planets=None, nside=DEFAULT_NSIDE, scale=1e5):
@@ -157,22 +303,26 @@ class PlanetMaskBasisFunction(BaseBasisFunction):
         self.planets = planets
         self.mask_radius = np.radians(mask_radius)
         self.result = np.zeros(hp.nside2npix(nside))
-        # set up a kdtree. Could maybe use healpy.query_disc instead.
-        self.in_fov = HpInLsstFov(nside=nside, fov_radius=mask_radius, scale=scale)
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, indx=None):
-        result = self.result.copy()
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
+        touched = []
         for pn in self.planets:
-            indices = self.in_fov(
-                np.max(conditions.planet_positions[pn + "_RA"]),
-                np.max(conditions.planet_positions[pn + "_dec"]),
-            )
+            # planet_positions hold a single position per planet
+            ra = np.max(conditions.planet_positions[pn + "_RA"])
+            dec = np.max(conditions.planet_positions[pn + "_dec"])
+            vec = hp.ang2vec(np.pi / 2.0 - dec, ra)
+            indices = hp.query_disc(self.nside, vec, self.mask_radius)
             result[indices] = np.nan
+            touched.append(indices)
 
-        return result
+        self._touched = np.concatenate(touched) if len(touched) > 0 else None
+        return _read_only(result)
 
 
-class AltAzShadowMaskBasisFunction(BaseBasisFunction):
+class AltAzShadowMaskBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Mask out a range of altitudes and azimuths, including
      regions which will enter the mask within `shadow_minutes`.
 
@@ -229,44 +379,39 @@ class AltAzShadowMaskBasisFunction(BaseBasisFunction):
         self.max_az = np.radians(max_az)
         self.shadow_time = shadow_minutes / 60.0 / 24.0  # To days
         self.pad = np.radians(pad)
-
-        self.r_min_alt = IntRounded(self.min_alt)
-        self.r_max_alt = IntRounded(self.max_alt)
         self.scale = scale
+        self._scratch = np.zeros(hp.nside2npix(self.nside), dtype=float)
+        # Reused to combine the (possibly disjoint) conditions limits
+        self._combined = np.zeros(hp.nside2npix(self.nside), dtype=bool)
+        # The basis function azimuth range does not change between calls
+        self._limit_az = np.abs(self.max_az - self.min_az) < 2 * np.pi
+        self._az_range = (self.max_az - self.min_az) % (2 * np.pi)
 
     def _calc_value(self, conditions, indx=None):
         # Basis function value will be 0 except where masked (then np.nan)
-        result = np.zeros(hp.nside2npix(self.nside), dtype=float)
+        result = self._scratch = _reset_scratch(self._scratch, 0.0, None)
 
         # Compute the alt,az values in the future. Use the conditions object
         # so the results are cached and can be used by other surveys is
         # needed. Technically this could fail if the masked region is
         # very narrow or shadow time is very large.
         future_alt, future_az = conditions.future_alt_az(float(np.max(conditions.mjd)) + self.shadow_time)
-        r_future_alt = IntRounded(future_alt)
-        r_current_alt = IntRounded(conditions.alt)
+        current_alt = conditions.alt
+        tol = _ATOL
 
         # Check the basis function altitude limits, now and future
-        result[np.where(r_current_alt < self.r_min_alt)] = np.nan
-        result[np.where(r_current_alt > self.r_max_alt)] = np.nan
-        result[np.where(r_future_alt < self.r_min_alt)] = np.nan
-        result[np.where(r_future_alt > self.r_max_alt)] = np.nan
+        in_range_alt = _alt_in_range(current_alt, future_alt, self.min_alt - tol, self.max_alt + tol)
+        result[~in_range_alt] = np.nan
 
         # Check the conditions objects 'sky_alt_limit', now and future
         if (conditions.sky_alt_limits is not None) and (len(conditions.sky_alt_limits) > 0):
-            combined = np.zeros(hp.nside2npix(self.nside), dtype=float)
+            combined = self._combined
+            combined.fill(False)
             for limits in conditions.sky_alt_limits:
                 # For conditions-based limits, must add pad
                 # And remember that discontinuous areas can be allowed
-                in_bounds = np.ones(hp.nside2npix(self.nside), dtype=float)
-                min_alt = IntRounded(limits[0])
-                max_alt = IntRounded(limits[1])
-                in_bounds[np.where(r_current_alt < min_alt)] = 0
-                in_bounds[np.where(r_current_alt > max_alt)] = 0
-                in_bounds[np.where(r_future_alt < min_alt)] = 0
-                in_bounds[np.where(r_future_alt > max_alt)] = 0
-                combined += in_bounds
-            result[np.where(combined == 0)] = np.nan
+                combined |= _alt_in_range(current_alt, future_alt, limits[0] - tol, limits[1] + tol)
+            result[~combined] = np.nan
         # And check against the telescope 'tel_alt_limits'.
         # The tel_alt_limits could be combined with the sky_alt_limits,
         # but it's a bit tricky because sky_alt_limits are (potentially)
@@ -274,46 +419,43 @@ class AltAzShadowMaskBasisFunction(BaseBasisFunction):
         # wide set of allowable area which explicitly disallows anything
         # outside that range. The az limits versions are similar.
         if conditions.tel_alt_limits is not None:
-            min_alt = IntRounded(conditions.tel_alt_limits[0])
-            max_alt = IntRounded(conditions.tel_alt_limits[1])
-            result[np.where(r_current_alt < min_alt)] = np.nan
-            result[np.where(r_current_alt > max_alt)] = np.nan
-            result[np.where(r_future_alt < min_alt)] = np.nan
-            result[np.where(r_future_alt > max_alt)] = np.nan
-
-        # note that % (mod) is not supported for IntRounded
+            in_range_alt = _alt_in_range(
+                current_alt,
+                future_alt,
+                conditions.tel_alt_limits[0] - tol,
+                conditions.tel_alt_limits[1] + tol,
+            )
+            result[~in_range_alt] = np.nan
+
         two_pi = 2 * np.pi
         # Check the basis function azimuth limits, now and future
-        if np.abs(self.max_az - self.min_az) < two_pi:
-            az_range = (self.max_az - self.min_az) % (two_pi)
-            out_of_bounds = np.where((conditions.az - self.min_az) % (two_pi) > az_range)[0]
-            result[out_of_bounds] = np.nan
-            out_of_bounds = np.where((future_az - self.min_az) % (two_pi) > az_range)[0]
+        if self._limit_az:
+            out_of_bounds = ((conditions.az - self.min_az) % (two_pi) > self._az_range) | (
+                (future_az - self.min_az) % (two_pi) > self._az_range
+            )
             result[out_of_bounds] = np.nan
         # Check the conditions objects azimuth limits, now and future
         if (conditions.sky_az_limits is not None) and (len(conditions.sky_az_limits) > 0):
-            combined = np.zeros(hp.nside2npix(self.nside), dtype=float)
+            combined = self._combined
+            combined.fill(False)
             for limits in conditions.sky_az_limits:
-                in_bounds = np.ones(hp.nside2npix(self.nside), dtype=float)
                 min_az = limits[0]
                 max_az = limits[1]
                 if np.abs(max_az - min_az) < two_pi:
                     az_range = (max_az - min_az) % (two_pi)
-                    out_of_bounds = np.where((conditions.az - min_az) % (two_pi) > az_range)[0]
-                    in_bounds[out_of_bounds] = 0
-                    out_of_bounds = np.where((future_az - min_az) % (two_pi) > az_range)[0]
-                    in_bounds[out_of_bounds] = 0
-                combined += in_bounds
-            result[np.where(combined == 0)] = np.nan
+                    combined |= ((conditions.az - min_az) % (two_pi) <= az_range) & (
+                        (future_az - min_az) % (two_pi) <= az_range
+                    )
+                else:
+                    combined[:] = True
+            result[~combined] = np.nan
         # Check against the kinematic hard limits.
         if conditions.tel_az_limits is not None:
             if np.abs(conditions.tel_az_limits[1] - conditions.tel_az_limits[0]) < two_pi:
                 az_range = (conditions.tel_az_limits[1] - conditions.tel_az_limits[0]) % (two_pi)
-                out_of_bounds = np.where((conditions.az - conditions.tel_az_limits[0]) % (two_pi) > az_range)[
-                    0
-                ]
-                result[out_of_bounds] = np.nan
-                out_of_bounds = np.where((future_az - conditions.tel_az_limits[0]) % (two_pi) > az_range)[0]
+                out_of_bounds = ((conditions.az - conditions.tel_az_limits[0]) % (two_pi) > az_range) | (
+                    (future_az - conditions.tel_az_limits[0]) % (two_pi) > az_range
+                )
                 result[out_of_bounds] = np.nan
 
         # Grow the resulting mask by self.pad, to avoid field centers
@@ -323,10 +465,10 @@ class AltAzShadowMaskBasisFunction(BaseBasisFunction):
             to_mask_indx = _hp_grow_mask(self.nside, tuple(mask_indx), scale=self.scale, grow_size=self.pad)
             result[to_mask_indx] = np.nan
 
-        return result
+        return _read_only(result)
 
 
-class MoonAvoidanceBasisFunction(BaseBasisFunction):
+class MoonAvoidanceBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Avoid observing within `moon_distance` of the moon.
 
     Parameters
@@ -349,22 +491,39 @@ class MoonAvoidanceBasisFunction(BaseBasisFunction):
         super(MoonAvoidanceBasisFunction, self).__init__(nside=nside)
         self.update_on_newobs = False
 
-        self.moon_distance = IntRounded(np.radians(moon_distance))
+        self.moon_distance = np.radians(moon_distance)
+        # The haversine of the separation increases monotonically with
+        # the separation, so threshold on it and skip arcsin and sqrt.
+        self._max_hav = np.sin((self.moon_distance - _ATOL) / 2.0) ** 2
         self.result = np.ones(hp.nside2npix(self.nside), dtype=float)
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, indx=None):
-        result = self.result.copy()
-
-        angular_distance = _angular_separation(
-            conditions.az, conditions.alt, conditions.moon_az, conditions.moon_alt
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
+
+        # Haversine of the distance to the moon (as in
+        # _angular_separation) and the threshold test, fused into
+        # a single numexpr pass.
+        to_mask = ne.evaluate(
+            "sin((alt - moon_alt) / 2.0) ** 2 + cos(alt) * cos_moon_alt * sin((az - moon_az) / 2.0) ** 2"
+            " < max_hav",
+            local_dict={
+                "alt": conditions.alt,
+                "az": conditions.az,
+                "moon_alt": float(conditions.moon_alt),
+                "moon_az": float(conditions.moon_az),
+                "cos_moon_alt": float(np.cos(conditions.moon_alt)),
+                "max_hav": self._max_hav,
+            },
         )
+        result[to_mask] = np.nan
+        self._touched = to_mask
 
-        result[IntRounded(angular_distance) < self.moon_distance] = np.nan
-
-        return result
+        return _read_only(result)
 
 
-class BulkCloudBasisFunction(BaseBasisFunction):
+class BulkCloudBasisFunction(_ScratchMixin, BaseBasisFunction):
     """Mark healpixels on a map if their cloud values are greater than
     the same healpixels on a maximum cloud map.
 
@@ -385,12 +544,14 @@ class BulkCloudBasisFunction(BaseBasisFunction):
         self.update_on_newobs = False
 
         if max_cloud_map is None:
-            self.max_cloud_map = np.zeros(hp.nside2npix(nside), dtype=float) + max_val
+            self.max_cloud_map = np.full(hp.nside2npix(nside), max_val, dtype=float)
         else:
             self.max_cloud_map = max_cloud_map
         self.out_of_bounds_area = np.where(self.max_cloud_map > 1.0)[0]
         self.out_of_bounds_val = out_of_bounds_val
         self.result = np.ones(hp.nside2npix(self.nside))
+        self._scratch = self.result.copy()
+        self._touched = None
 
     def _calc_value(self, conditions, indx=None):
         """
@@ -404,18 +565,20 @@ class BulkCloudBasisFunction(BaseBasisFunction):
         max_cloud_map value are marked as unseen.
         """
 
-        result = self.result.copy()
+        result = self._scratch = _reset_scratch(self._scratch, self.result, self._touched)
 
-        clouded = np.where(self.max_cloud_map <= conditions.bulk_cloud)
+        clouded = self.max_cloud_map <= conditions.bulk_cloud
         result[clouded] = self.out_of_bounds_val
+        self._touched = clouded
 
-        return result
+        return _read_only(result)
 
 
-class MapCloudBasisFunction(BaseBasisFunction):
+class MapCloudBasisFunction(BulkCloudBasisFunction):
     """Mark healpixels on a map if their cloud values are greater than
     the same healpixels on a maximum cloud map. Currently a placeholder for
-    when the telemetry stream can include a full sky cloud map.
+    when the telemetry stream can include a full sky cloud map, so this
+    behaves identically to `BulkCloudBasisFunction`.
 
     Parameters
     ----------
@@ -428,34 +591,3 @@ class MapCloudBasisFunction(BaseBasisFunction):
         Point value to give regions where there are no observations
         requested
     """
-
-    def __init__(self, nside=DEFAULT_NSIDE, max_cloud_map=None, max_val=0.7, out_of_bounds_val=np.nan):
-        super().__init__(nside=nside)
-        self.update_on_newobs = False
-
-        if max_cloud_map is None:
-            self.max_cloud_map = np.zeros(hp.nside2npix(nside), dtype=float) + max_val
-        else:
-            self.max_cloud_map = max_cloud_map
-        self.out_of_bounds_area = np.where(self.max_cloud_map > 1.0)[0]
-        self.out_of_bounds_val = out_of_bounds_val
-        self.result = np.ones(hp.nside2npix(self.nside))
-
-    def _calc_value(self, conditions, indx=None):
-        """
-        Parameters
-        ----------
-        indx : list (None)
-            Index values to compute, if None, full map is computed
-        Returns
-        -------
-        Healpix map where pixels with a cloud value greater than the
-        max_cloud_map value are marked as unseen.
-        """
-
-        result = self.result.copy()
-
-        clouded = np.where(self.max_cloud_map <= conditions.bulk_cloud)
-        result[clouded] = self.out_of_bounds_val
-
-        return result
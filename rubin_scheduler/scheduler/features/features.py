@@ -28,7 +28,7 @@ from rubin_scheduler.utils import (
     DEFAULT_NSIDE,
     SURVEY_START_MJD,
     _angular_separation,
-    _hpid2_ra_dec,
+    _ra_dec_for_nside,
     calc_season,
 )
 
@@ -418,7 +418,7 @@ class NObservationsCurrentSeason(BaseSurveyFeature):
 
         # Set up feature values - this includes the count in a given season
         # Find the healpixels for each point on the sky
-        self.ra, self.dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
+        self.ra, self.dec = _ra_dec_for_nside(nside)
         self.ra_deg = np.degrees(self.ra)
 
         self.mjd = mjd_start
@@ -443,7 +443,8 @@ class CoreScheduler:
             label = this_basis_func.label()
             if label in maps:
                 label = f"{label} @{id(this_basis_func)}"
-            maps[label] = this_basis_func(conditions)
+            # Some basis functions reuse (read-only) arrays between calls
+            maps[label] = deepcopy(this_basis_func(conditions))
 
         return maps
 
@@ -3,6 +3,7 @@ __all__ = (
     "ra_dec2_hpid",
     "healbin",
     "_hpid2_ra_dec",
+    "_ra_dec_for_nside",
     "_ra_dec2_hpid",
     "_healbin",
     "moc2array",
@@ -44,6 +45,31 @@ def _hpid2_ra_dec(nside, hpids, **kwargs):
     return ra_ret, dec_ret
 
 
+@lru_cache(maxsize=8)
+def _ra_dec_for_nside(nside):
+    """RA and dec of every healpixel at nside.
+
+    Results are cached, so all callers using the same nside share one
+    copy of the arrays. The arrays are read-only for that reason.
+
+    Parameters
+    ----------
+    nside : int
+        Must be a value of 2^N.
+
+    Returns
+    -------
+    ra : np.array
+        RA positions of all healpixels. In radians.
+    dec : np.array
+        Dec positions of all healpixels. In radians.
+    """
+    ra, dec = _hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
+    ra.flags.writeable = False
+    dec.flags.writeable = False
+    return ra, dec
+
+
 def hpid2_ra_dec(nside, hpids, **kwargs):
     """
     Correct for healpy being silly and running dec from 0-180.
@@ -0,0 +1,266 @@
+import contextlib
+import hashlib
+import importlib
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import requests
+
+from rubin_scheduler.data import data_versions
+
+# The package re-exports a function of the same name as this module
+sdd = importlib.import_module("rubin_scheduler.data.scheduler_download_data")
+
+
+class TestVersionMetadata(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        self.version_file = os.path.join(self.data_dir, "versions.txt")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_columns(self):
+        """Read versions.txt files written with 2, 3 and 4 columns"""
+        with open(self.version_file, "w") as f:
+            print("site_models,site_models_v1.tgz", file=f)
+            print("scheduler,scheduler_v1.tgz,etag1", file=f)
+            print("utils,utils_v1.tgz,etag2,abc123", file=f)
+            print("skybrightness_pre,skybrightness_pre_v1.tgz,,def456", file=f)
+        etags, digests = sdd._version_metadata(self.version_file)
+        self.assertEqual(etags, {"scheduler": "etag1", "utils": "etag2"})
+        self.assertEqual(digests, {"utils": "abc123", "skybrightness_pre": "def456"})
+        # Missing file
+        self.assertEqual(sdd._version_metadata(self.version_file + ".missing"), ({}, {}))
+
+    def download(self, etag, fail=False, head_error=None, **kwargs):
+        """Run download_rubin_data against a fake server, returning the
+        names of the files downloaded (or attempted, if fail)."""
+        session = mock.MagicMock()
+        session.get.return_value.status_code = 200
+        session.head.return_value.status_code = 200
+        session.head.return_value.headers = {"ETag": f'"{etag}"'}
+        session.head.side_effect = head_error
+        downloaded = []
+
+        def fake_download(url, filename, data_dir, **kwargs):
+            os.makedirs(os.path.join(data_dir, filename.split("_")[0]), exist_ok=True)
+            downloaded.append(filename)
+            if fail:
+                raise ValueError("sha256 mismatch")
+            return etag, "0" * 64
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(mock.patch.dict(os.environ, {"RUBIN_SIM_DATA_DIR": self.data_dir}))
+            stack.enter_context(mock.patch.object(sdd, "_make_session", return_value=session))
+            stack.enter_context(mock.patch.object(sdd, "_download_and_unpack", side_effect=fake_download))
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            stack.enter_context(warnings.catch_warnings())
+            warnings.simplefilter("ignore")
+            if fail:
+                with self.assertRaises(RuntimeError):
+                    sdd.download_rubin_data({"utils": "utils_v1.tgz"}, tdqm_disable=True, **kwargs)
+                self.assertEqual(data_versions(), {})
+            else:
+                sdd.download_rubin_data({"utils": "utils_v1.tgz"}, tdqm_disable=True, **kwargs)
+                self.assertEqual(data_versions(), {"utils": "utils_v1.tgz"})
+        return downloaded
+
+    def test_round_trip(self):
+        """Downloads are recorded with their ETag and sha256, readable
+        by data_versions, and re-fetched by update if the ETag changes"""
+        self.assertEqual(self.download("etag1"), ["utils_v1.tgz"])
+        with open(self.version_file) as f:
+            self.assertEqual(f.read(), "utils,utils_v1.tgz,etag1," + "0" * 64 + "\n")
+        self.assertEqual(sdd._version_metadata(self.version_file), ({"utils": "etag1"}, {"utils": "0" * 64}))
+
+        # Already on disk, not updating
+        self.assertEqual(self.download("etag1"), [])
+        # Updating, remote file unchanged
+        self.assertEqual(self.download("etag1", update=True), [])
+        # Updating, remote ETag can't be checked
+        head_error = requests.exceptions.ConnectionError()
+        self.assertEqual(self.download("etag2", update=True, head_error=head_error), [])
+        # Updating, remote file replaced under the same name
+        self.assertEqual(self.download("etag2", update=True), ["utils_v1.tgz"])
+        self.assertEqual(sdd._version_metadata(self.version_file)[0], {"utils": "etag2"})
+
+    def test_failed_download(self):
+        """A failed download leaves neither its directory nor its
+        version record behind"""
+        self.assertEqual(self.download("etag1"), ["utils_v1.tgz"])
+        self.assertEqual(self.download("etag1", fail=True, force=True), ["utils_v1.tgz"])
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, "utils")))
+        self.assertEqual(sdd._version_metadata(self.version_file), ({}, {}))
+        # So the next run downloads it again
+        self.assertEqual(self.download("etag1"), ["utils_v1.tgz"])
+
+
+class TestUnpack(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        self.contents = {"utils/a.txt": b"a" * 5000, "utils/b/c.txt": bytes(range(256)) * 40}
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tf:
+            for name, data in self.contents.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        # Servers may pad the end of a file, which must still be read
+        self.archive = buffer.getvalue() + b"\0" * 1000
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_unpacked(self):
+        for name, data in self.contents.items():
+            with open(os.path.join(self.data_dir, name), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_hashing_reader(self):
+        reader = sdd._HashingReader(io.BytesIO(self.archive))
+        while reader.read(100):
+            pass
+        self.assertEqual(reader.hexdigest(), hashlib.sha256(self.archive).hexdigest())
+
+    def test_unpack_tarfile(self):
+        """Unpack with tarfile, reading the whole stream"""
+        reader = sdd._HashingReader(io.BytesIO(self.archive))
+        with mock.patch.object(sdd, "which", return_value=None):
+            sdd._unpack_tgz(reader, self.data_dir, block_size=100)
+        self.check_unpacked()
+        self.assertEqual(reader.hexdigest(), hashlib.sha256(self.archive).hexdigest())
+
+    def test_unpack_tarfile_truncated(self):
+        with mock.patch.object(sdd, "which", return_value=None):
+            with self.assertRaises(tarfile.TarError):
+                sdd._unpack_tgz(io.BytesIO(self.archive[:100]), self.data_dir, block_size=100)
+
+    @unittest.skipIf(shutil.which("pigz") is None or shutil.which("tar") is None, "pigz not available")
+    def test_unpack_pigz(self):
+        """Unpack with tar and pigz, reading the whole stream"""
+        reader = sdd._HashingReader(io.BytesIO(self.archive))
+        sdd._unpack_tgz(reader, self.data_dir, block_size=100)
+        self.check_unpacked()
+        self.assertEqual(reader.hexdigest(), hashlib.sha256(self.archive).hexdigest())
+        with self.assertRaises(subprocess.CalledProcessError):
+            sdd._unpack_tgz(io.BytesIO(self.archive[:100]), self.data_dir, block_size=100)
+
+    def unpack_mocked(self, fileobj, tar_returncode=0):
+        """Unpack with mocked pigz and tar processes, kept as self.pigz
+        and self.tar along with the arguments they were started with"""
+        self.pigz = mock.MagicMock()
+        self.tar = mock.MagicMock()
+        self.pigz.wait.return_value = 0
+        self.tar.wait.return_value = tar_returncode
+        with mock.patch.object(sdd, "which", return_value="/usr/bin/pigz"):
+            with mock.patch.object(sdd.subprocess, "Popen", side_effect=[self.pigz, self.tar]) as popen:
+                try:
+                    sdd._unpack_tgz(fileobj, self.data_dir, block_size=100)
+                finally:
+                    self.popen_args = [call.args[0] for call in popen.call_args_list]
+
+    def test_unpack_pigz_args(self):
+        """pigz output is piped into tar, as any tar (not only GNU tar)
+        can unpack an uncompressed stream"""
+        self.unpack_mocked(io.BytesIO(self.archive))
+        self.assertEqual(self.popen_args, [["pigz", "-dc"], ["tar", "-xf", "-", "-C", self.data_dir]])
+        written = b"".join(call.args[0] for call in self.pigz.stdin.write.call_args_list)
+        self.assertEqual(written, self.archive)
+        self.pigz.stdin.close.assert_called_once()
+        # A failing tar is reported
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.unpack_mocked(io.BytesIO(self.archive), tar_returncode=2)
+
+    def test_unpack_pigz_read_error(self):
+        """A failed read should not leave pigz or tar running"""
+        fileobj = mock.MagicMock()
+        fileobj.read.side_effect = ConnectionError("connection lost")
+        with self.assertRaises(ConnectionError):
+            self.unpack_mocked(fileobj)
+        for proc in (self.pigz, self.tar):
+            proc.kill.assert_called_once()
+            proc.wait.assert_called_once()
+
+
+class TestDigest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tf:
+            info = tarfile.TarInfo("utils/a.txt")
+            info.size = 1000
+            tf.addfile(info, io.BytesIO(b"a" * 1000))
+        self.archive = buffer.getvalue()
+        self.digest = hashlib.sha256(self.archive).hexdigest()
+        self.url = "https://example.com/utils_v1.tgz"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_session(self, sha256_status=200, sha256_text=""):
+        """Make a fake session serving the archive and its .sha256"""
+        archive = self.archive
+
+        def get(url, stream=False):
+            response = mock.MagicMock()
+            response.__enter__.return_value = response
+            if url.endswith(".sha256"):
+                response.status_code = sha256_status
+                response.text = sha256_text
+            else:
+                response.status_code = 200
+                response.headers = {"Content-Length": str(len(archive)), "ETag": '"etag1"'}
+                response.raw = io.BytesIO(archive)
+            return response
+
+        session = mock.MagicMock()
+        session.get.side_effect = get
+        return session
+
+    def test_expected_sha256(self):
+        sha256_text = f"{self.digest.upper()}  utils_v1.tgz\n"
+        session = self.make_session(sha256_text=sha256_text)
+        self.assertEqual(sdd._expected_sha256(self.url, session=session), self.digest)
+        # Missing, or an error or index page served in its place
+        for status, text in [(404, sha256_text), (200, ""), (200, "<html>" + self.digest), (200, "abc123")]:
+            session = self.make_session(sha256_status=status, sha256_text=text)
+            self.assertIsNone(sdd._expected_sha256(self.url, session=session))
+        session = mock.MagicMock()
+        session.get.side_effect = requests.exceptions.ConnectionError()
+        self.assertIsNone(sdd._expected_sha256(self.url, session=session))
+
+    def download(self, session):
+        # The test archive is small enough to trigger the size warning
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return sdd._download_and_unpack(
+                self.url, "utils_v1.tgz", self.data_dir, tdqm_disable=True, session=session
+            )
+
+    def test_download_digest(self):
+        # Matching digest
+        session = self.make_session(sha256_text=f"{self.digest}  utils_v1.tgz\n")
+        self.assertEqual(self.download(session), ("etag1", self.digest))
+        self.assertTrue(os.path.isfile(os.path.join(self.data_dir, "utils", "a.txt")))
+        # No digest published
+        session = self.make_session(sha256_status=404)
+        self.assertEqual(self.download(session), ("etag1", self.digest))
+        # Mismatched digest
+        session = self.make_session(sha256_text="0" * 64)
+        with self.assertRaises(ValueError):
+            self.download(session)
+
+
+if __name__ == "__main__":
+    unittest.main()
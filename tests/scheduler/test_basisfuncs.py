@@ -1,12 +1,16 @@
+import pickle
 import unittest
 import warnings
+from unittest import mock
 
+import healpy as hp
 import numpy as np
 
 import rubin_scheduler.scheduler.basis_functions as basis_functions
 from rubin_scheduler.scheduler.features import Conditions
 from rubin_scheduler.scheduler.model_observatory import ModelObservatory
 from rubin_scheduler.scheduler.utils import ObservationArray
+from rubin_scheduler.utils import _angular_separation
 
 
 class TestBasis(unittest.TestCase):
@@ -457,5 +461,131 @@ class TestBasis(unittest.TestCase):
                 assert issubclass(w[-1].category, (DeprecationWarning, FutureWarning))
 
 
+class TestMaskBasis(unittest.TestCase):
+    """Mask basis function checks which need no downloaded data."""
+
+    nside = 16
+
+    def make_conditions(self, mjd, lmst, sun_ra, moon_az, bulk_cloud):
+        conditions = Conditions(nside=self.nside, mjd=mjd)
+        conditions.lmst = lmst
+        conditions.sun_ra = sun_ra
+        conditions.sun_dec = -0.2
+        conditions.moon_alt = 0.4
+        conditions.moon_az = moon_az
+        conditions.bulk_cloud = bulk_cloud
+        conditions.planet_positions = {
+            "venus_RA": sun_ra + 0.5,
+            "venus_dec": 0.1,
+            "mars_RA": 2.0,
+            "mars_dec": -0.3,
+            "jupiter_RA": 4.0 + moon_az,
+            "jupiter_dec": 0.2,
+        }
+        return conditions
+
+    def make_masks(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            solar_elong = basis_functions.SolarElongMaskBasisFunction(nside=self.nside)
+        return [
+            solar_elong,
+            basis_functions.HaMaskBasisFunction(ha_min=-2.0, ha_max=3.0, nside=self.nside),
+            basis_functions.SolarElongationMaskBasisFunction(
+                min_elong=30.0, max_elong=100.0, nside=self.nside
+            ),
+            basis_functions.PlanetMaskBasisFunction(mask_radius=10.0, nside=self.nside),
+            basis_functions.MoonAvoidanceBasisFunction(nside=self.nside),
+            basis_functions.MapCloudBasisFunction(nside=self.nside, out_of_bounds_val=-1.0),
+            basis_functions.AltAzShadowMaskBasisFunction(nside=self.nside, pad=10.0),
+            basis_functions.AreaCheckMaskBasisFunction(
+                [basis_functions.MoonAvoidanceBasisFunction(nside=self.nside)], nside=self.nside
+            ),
+        ]
+
+    def test_repeat_calls(self):
+        """Reused result arrays should match a freshly built map."""
+        conditions_list = [
+            self.make_conditions(60200.1, 2.0, 1.0, 0.5, 0.0),
+            self.make_conditions(60200.3, 8.0, 1.5, 3.0, 0.9),
+            self.make_conditions(60200.2, 5.0, 5.0, 5.5, 0.2),
+        ]
+        for i, bf in enumerate(self.make_masks()):
+            for conditions in conditions_list:
+                result = bf(conditions)
+                fresh = self.make_masks()[i]
+                np.testing.assert_array_equal(result, fresh(conditions), err_msg=bf.label())
+                # Callers can't modify the (reused) returned map
+                with self.assertRaises(ValueError):
+                    result[0:100] = np.nan
+
+        # Unpickled masks (as from a scheduler snapshot) still work,
+        # whether or not they were called before pickling
+        for protocol in [4, 5]:
+            for i, bf in enumerate(self.make_masks()):
+                for conditions in conditions_list:
+                    bf = pickle.loads(pickle.dumps(bf, protocol=protocol))
+                    fresh = self.make_masks()[i]
+                    np.testing.assert_array_equal(bf(conditions), fresh(conditions), err_msg=bf.label())
+
+        # As does a reused array which can't be made writeable again
+        scratch = np.frombuffer(np.zeros(10).tobytes())
+        result = basis_functions.mask_basis_funcs._reset_scratch(scratch, np.ones(10), np.arange(2))
+        self.assertIsNot(result, scratch)
+        np.testing.assert_array_equal(result, np.ones(10))
+
+    def test_planet_mask(self):
+        """Planet masks should cover the pixels within mask_radius."""
+        conditions = self.make_conditions(60200.1, 2.0, 1.0, 0.5, 0.0)
+        mask_radius = 10.0
+        bf = basis_functions.PlanetMaskBasisFunction(mask_radius=mask_radius, nside=self.nside)
+        result = bf(conditions)
+        close = np.zeros(result.size, dtype=bool)
+        for planet in bf.planets:
+            close |= _angular_separation(
+                conditions.ra,
+                conditions.dec,
+                conditions.planet_positions[planet + "_RA"],
+                conditions.planet_positions[planet + "_dec"],
+            ) < np.radians(mask_radius)
+        np.testing.assert_array_equal(np.isnan(result), close)
+        self.assertTrue(np.all(result[~close] == 0))
+
+    def test_area_check(self):
+        """Area check feasibility should match the area left unmasked
+        by the product of all the masks."""
+        conditions_list = [
+            self.make_conditions(60200.1, 2.0, 1.0, 0.5, 0.0),
+            self.make_conditions(60200.3, 8.0, 1.5, 3.0, 0.9),
+        ]
+        pix_area = hp.nside2pixarea(self.nside, degrees=True)
+        for conditions in conditions_list:
+            bf_list = [
+                basis_functions.MoonAvoidanceBasisFunction(nside=self.nside),
+                basis_functions.HaMaskBasisFunction(ha_min=-2.0, ha_max=3.0, nside=self.nside),
+                basis_functions.AltAzShadowMaskBasisFunction(nside=self.nside, pad=0),
+            ]
+            product = np.ones(hp.nside2npix(self.nside))
+            for bf in bf_list:
+                product *= bf(conditions)
+            good_area = pix_area * np.sum(product == 0)
+            for min_area in [0.0, good_area - 1.0, good_area, good_area + 1.0, 1e6]:
+                area_check = basis_functions.AreaCheckMaskBasisFunction(
+                    bf_list, nside=self.nside, min_area=min_area
+                )
+                self.assertEqual(area_check.check_feasibility(conditions), good_area >= min_area)
+
+        # Once too little area is left, later masks are not evaluated
+        later = mock.MagicMock()
+        later.check_feasibility.return_value = True
+        area_check = basis_functions.AreaCheckMaskBasisFunction(
+            [basis_functions.AltAzShadowMaskBasisFunction(nside=self.nside, pad=0), later],
+            nside=self.nside,
+            min_area=1e6,
+        )
+        self.assertFalse(area_check.check_feasibility(conditions))
+        later.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
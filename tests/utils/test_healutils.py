@@ -33,6 +33,22 @@ class TestHealUtils(unittest.TestCase):
 
         np.testing.assert_array_equal(hpids, hpids_return)
 
+    def test_ra_dec_for_nside(self):
+        """
+        Test that the cached full-sky Ra Dec arrays match and are shared
+        """
+
+        nside = 32
+        ra, dec = utils._ra_dec_for_nside(nside)
+        ra_check, dec_check = utils._hpid2_ra_dec(nside, np.arange(hp.nside2npix(nside)))
+
+        np.testing.assert_array_equal(ra, ra_check)
+        np.testing.assert_array_equal(dec, dec_check)
+        # Repeated calls return the same (read-only) arrays
+        self.assertIs(utils._ra_dec_for_nside(nside)[0], ra)
+        self.assertFalse(ra.flags.writeable)
+        self.assertFalse(dec.flags.writeable)
+
     def test_bin_rad(self):
         """
         Test that healbin returns correct values and valid healpy maps.